@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Gemeinsame Gerätekonfiguration für die Skyobjects-Skripte.
+
+DEVICE, DEVICE_INDEX und DTYPE werden einmalig beim Import bestimmt, damit
+beide Einstiegsskripte dieselbe, zueinander passende Kombination aus Gerät
+und Datentyp verwenden und z. B. kein hartkodiertes device=0 auf Rechnern
+ohne GPU abstürzt.
+"""
+
+from contextlib import nullcontext
+import os
+import torch
+
+# CPU-Thread-Konfiguration: zu viele Threads verschlechtern die Latenz der
+# kleinen Attention-Matmuls dieses Workloads. Standard sind die physischen
+# Kerne (halbe logische Kernzahl), überschreibbar per ASTRO_THREADS;
+# ASTRO_PIN=1 pinnt den Prozess zusätzlich auf diese Kerne (nur Linux).
+NUM_THREADS = int(os.environ.get("ASTRO_THREADS", max(1, (os.cpu_count() or 2) // 2)))
+torch.set_num_threads(NUM_THREADS)
+try:
+    torch.set_num_interop_threads(1)
+except RuntimeError:
+    pass  # Interop-Pool wurde bereits initialisiert
+
+if os.environ.get("ASTRO_PIN") == "1" and hasattr(os, "sched_setaffinity"):
+    os.sched_setaffinity(0, range(NUM_THREADS))
+
+# BF16 auf der CPU nur, wenn die Hardware es unterstützt (AVX512-BF16)
+CPU_BF16 = getattr(torch.cpu, "_is_cpu_support_avx512_bf16", lambda: False)()
+
+if torch.cuda.is_available():
+    DEVICE, DEVICE_INDEX, DTYPE = "cuda", 0, torch.float16
+elif hasattr(torch.backends, "mps") and torch.backends.mps.is_available():
+    DEVICE, DEVICE_INDEX, DTYPE = "mps", 0, torch.float16
+else:
+    # Auf der CPU bleiben die Gewichte FP32 (und damit quantisierbar);
+    # BF16 wird per Autocast nur auf die Aktivierungen angewendet.
+    DEVICE, DEVICE_INDEX, DTYPE = "cpu", -1, None
+
+def autocast():
+    """Liefert einen BF16-Autocast-Kontext auf unterstützten CPUs, sonst ein No-Op."""
+    if DEVICE == "cpu" and CPU_BF16:
+        return torch.autocast("cpu", dtype=torch.bfloat16)
+    return nullcontext()
@@ -2,24 +2,105 @@
 # -*- coding: utf-8 -*-
 
 from transformers import pipeline
+from functools import lru_cache
 import torch
 import re
 
-# Gerätekonfiguration (NVIDIA CUDA, Apple MPS oder CPU)
-device = (
-    "cuda" if torch.cuda.is_available() 
-    else "mps" if hasattr(torch.backends, "mps") and torch.backends.mps.is_available() 
-    else "cpu"
-)
+from skyastro_common import DEVICE, DEVICE_INDEX, DTYPE, CPU_BF16, autocast as _autocast
+
+# Hyperscan ist optional: falls vorhanden, wird die Namenssuche über eine
+# kompilierte DFA-Datenbank in O(|Frage|) ausgeführt, sonst per Regex.
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+# pyahocorasick ist ebenfalls optional: ein Trie mit Failure-Links findet
+# alle Namen in einem einzigen Durchlauf durch die Frage.
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 # Laden des deutschen Frage-Antwort-Modells
 model_name = "deepset/gelectra-base-germanquad"
-qa_pipeline = pipeline(
-    "question-answering",
-    model=model_name,
-    tokenizer=model_name,
-    device=0 if device != "cpu" else -1
-)
+
+# Bevorzugt: Export nach ONNX Runtime über optimum. ORT fusioniert
+# Attention, LayerNorm und GELU zu einzelnen Kernels, statt jede
+# Operation einzeln im Eager-Modus auszuführen.
+_USE_ORT = False
+try:
+    from optimum.onnxruntime import ORTModelForQuestionAnswering
+    from optimum.pipelines import pipeline as ort_pipeline
+
+    _ort_model = ORTModelForQuestionAnswering.from_pretrained(
+        model_name,
+        export=True,
+        provider="CUDAExecutionProvider" if DEVICE == "cuda" else "CPUExecutionProvider"
+    )
+    qa_pipeline = ort_pipeline(
+        "question-answering",
+        model=_ort_model,
+        tokenizer=model_name,
+        use_fast=True,
+        accelerator="ort"
+    )
+    _USE_ORT = True
+except Exception:
+    # Nicht nur fehlendes optimum: auch ein fehlgeschlagener Export oder ein
+    # nicht verfügbarer Execution-Provider (z. B. CPU-onnxruntime auf einer
+    # CUDA-Maschine) darf den Import nicht abbrechen — dann greift die
+    # Eager-Pipeline unten.
+    pass
+
+# Fallback: normale PyTorch-Pipeline.
+# Auf der GPU halbiert FP16 die Speicherbandbreite des Encoders;
+# auf der CPU bleiben die Gewichte FP32 und Autocast rechnet in BF16.
+if not _USE_ORT:
+    qa_pipeline = pipeline(
+        "question-answering",
+        model=model_name,
+        tokenizer=model_name,
+        use_fast=True,  # Rust-Tokenizer erzwingen statt des Python-Fallbacks
+        device=DEVICE_INDEX,
+        torch_dtype=DTYPE
+    )
+
+# Auf der CPU werden die Linear-Schichten dynamisch nach INT8 quantisiert;
+# falls die Intel Extension for PyTorch installiert ist, wird stattdessen
+# deren optimierter Graph verwendet. (Entfällt beim ONNX-Runtime-Modell.)
+if DEVICE == "cpu" and not _USE_ORT:
+    try:
+        import intel_extension_for_pytorch as ipex
+        qa_pipeline.model = ipex.optimize(
+            qa_pipeline.model,
+            dtype=torch.bfloat16 if CPU_BF16 else torch.float32
+        )
+    except ImportError:
+        qa_pipeline.model = torch.quantization.quantize_dynamic(
+            qa_pipeline.model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+
+# torch.compile fusioniert Pointwise-Ops und reduziert den Python-Overhead
+# pro Forward-Pass (ab PyTorch 2.1). Nur für das Eager-GPU-Modell sinnvoll:
+# das ONNX-Runtime-Modell ist bereits fusioniert, das CPU-Modell
+# quantisiert bzw. von IPEX optimiert.
+if not _USE_ORT and DEVICE == "cuda":
+    try:
+        _torch_version = tuple(int(p.split("+")[0]) for p in torch.__version__.split(".")[:2])
+        if _torch_version >= (2, 1):
+            qa_pipeline.model = torch.compile(qa_pipeline.model, mode="reduce-overhead", fullgraph=False)
+    except Exception:
+        pass  # bei Problemen beim Eager-Modell bleiben
+
+# Warmlauf: der erste Aufruf zahlt CUDA-Kontextaufbau, cuDNN-Autotuning
+# und Tokenizer-Initialisierung. Ein Dummy-Aufruf mit langem Kontext
+# verlagert diese Kosten vom ersten Nutzeraufruf an den Programmstart.
+# Er stößt auch die torch.compile-Kompilierung an.
+if DEVICE == "cuda":
+    torch.backends.cudnn.benchmark = True
+with _autocast():
+    qa_pipeline(question="Wie lautet das Warmlauf-Objekt?", context="Warmlauf-Kontext. " * 32)
 
 # Der Knowledge Graph: Liste von Himmelsobjekten
 knowledge_graph = [
@@ -65,47 +146,139 @@ knowledge_graph = [
     }
 ]
 
+# Einmalig beim Import aufgebaute Suchstrukturen: ein kompilierter
+# Vereinigungs-Regex über alle Objektnamen sowie ein Dictionary für
+# den direkten Zugriff per Kleinschreibung.
+_NAMES = [obj["name"] for obj in knowledge_graph]
+_NAME_RE = re.compile(
+    r"\b(" + "|".join(re.escape(name) for name in _NAMES) + r")\b",
+    re.IGNORECASE
+)
+_BY_LOWER = {obj["name"].lower(): obj for obj in knowledge_graph}
+
+# Die Kontext-Strings werden einmalig beim Laden vorformatiert, da der
+# Graph statisch ist — im heißen Pfad findet keine Interpolation mehr statt.
+for _obj in knowledge_graph:
+    _obj["_summary"] = (
+        f"{_obj['name']} ist ein {_obj['type']}. "
+        f"Es ist {_obj['distance_from_earth_ly']} Lichtjahre von der Erde entfernt. "
+        f"Seine Größe beträgt {_obj['size_km']} km und seine Masse beträgt {_obj['mass_kg']} kg. "
+        f"Seine Koordinaten sind RA: {_obj['coordinates']['ra']}, DEC: {_obj['coordinates']['dec']}."
+    )
+del _obj
+
+# Hyperscan-Datenbank über alle Objektnamen (einmalig kompiliert)
+_NAME_DB = None
+if hyperscan is not None:
+    _NAME_DB = hyperscan.Database()
+    # literal=True: Objektnamen wörtlich matchen, nicht als Regex deuten
+    _NAME_DB.compile(
+        expressions=[name.encode() for name in _NAMES],
+        ids=list(range(len(_NAMES))),
+        flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SOM_LEFTMOST] * len(_NAMES),
+        literal=True
+    )
+
+# Aho-Corasick-Automat über alle Objektnamen (einmalig aufgebaut)
+_NAME_AUTOMATON = None
+if ahocorasick is not None:
+    _NAME_AUTOMATON = ahocorasick.Automaton()
+    for i, name in enumerate(_NAMES):
+        _NAME_AUTOMATON.add_word(name.lower(), (i, name))
+    _NAME_AUTOMATON.make_automaton()
+
+def _scan_object_name(question):
+    """
+    Durchsucht die Frage mit der Hyperscan-Datenbank und liefert den
+    am weitesten links stehenden Treffer.
+    """
+    hits = []
+    _NAME_DB.scan(
+        question.encode(),
+        match_event_handler=lambda pat_id, start, end, flags, ctx: hits.append((start, pat_id))
+    )
+    return _NAMES[min(hits)[1]] if hits else None
+
+# Intent-Vorklassifikation: Fragen nach einzelnen Metadaten-Feldern lassen
+# sich direkt aus dem Knowledge Graph beantworten — der Forward-Pass durch
+# das QA-Modell entfällt dann komplett.
+_INTENT = [
+    (re.compile(r"\b(weit|entfernt|Lichtjahre?|Distanz|Entfernung)\b", re.IGNORECASE), "distance_from_earth_ly"),
+    (re.compile(r"\b(Größe|groß|Durchmesser)\b", re.IGNORECASE), "size_km"),
+    (re.compile(r"\b(Masse|schwer|wiegt)\b", re.IGNORECASE), "mass_kg"),
+    (re.compile(r"\b(Koordinaten|Position|Rektaszension|Deklination)\b", re.IGNORECASE), "coordinates"),
+]
+
+def _answer_from_graph(question, info):
+    """
+    Beantwortet Metadaten-Fragen direkt aus dem Knowledge Graph.
+    Liefert None, wenn kein Intent erkannt wird und das QA-Modell gefragt ist.
+    """
+    for pattern, field in _INTENT:
+        if not pattern.search(question):
+            continue
+        if field == "distance_from_earth_ly":
+            return f"{info['name']} ist {info['distance_from_earth_ly']} Lichtjahre von der Erde entfernt."
+        if field == "size_km":
+            return f"{info['name']} hat eine Größe von {info['size_km']} km."
+        if field == "mass_kg":
+            return f"{info['name']} hat eine Masse von {info['mass_kg']} kg."
+        if field == "coordinates":
+            return (
+                f"Die Koordinaten von {info['name']} sind "
+                f"RA: {info['coordinates']['ra']}, DEC: {info['coordinates']['dec']}."
+            )
+    return None
+
 def get_astronomy_info(object_name):
     """
     Sucht in der knowledge_graph-Liste nach einem Objekt mit dem Namen object_name.
     """
-    for obj in knowledge_graph:
-        if obj["name"].lower() == object_name.lower():
-            return obj
-    return None
+    return _BY_LOWER.get(object_name.lower())
 
+@lru_cache(maxsize=1024)
 def extract_object_name(question):
     """
     Versucht, den Namen eines Himmelsobjekts aus der Frage zu extrahieren,
-    indem bekannte Objektnamen überprüft werden.
+    indem bekannte Objektnamen überprüft werden. Wiederholte Fragen werden
+    memoisiert; knowledge_graph gilt für die Prozesslaufzeit als unveränderlich.
     """
-    for obj in knowledge_graph:
-        if obj["name"].lower() in question.lower():
-            return obj["name"]
-    # Fallback: regulärer Ausdruck
-    match = re.search(r"\b(Sonne|Sirius|Andromeda-Galaxie|Orion-Nebel|Jupiter)\b", question, re.IGNORECASE)
+    if _NAME_DB is not None:
+        return _scan_object_name(question)
+    if _NAME_AUTOMATON is not None:
+        for _, (_, name) in _NAME_AUTOMATON.iter(question.lower()):
+            return name
+        return None
+    match = _NAME_RE.search(question)
     return match.group(0) if match else None
 
+def clear_caches():
+    """
+    Leert die Memoisierungs-Caches, falls knowledge_graph doch einmal zur
+    Laufzeit verändert wird (Gegenstück zu reset_cache der Neo4j-Variante).
+    """
+    extract_object_name.cache_clear()
+
 def ask_astronomy_question(question):
     """
-    Baut einen Kontext aus den Fakten des entsprechenden Himmelsobjekts und
-    verwendet den QA-Pipeline, um die Antwort auf die Frage zu extrahieren.
+    Beantwortet Metadaten-Fragen direkt aus dem Knowledge Graph; nur für
+    offene Fragen ("Was ist X?", "Beschreibe X.") wird der vorformatierte
+    Kontext an den QA-Pipeline übergeben.
     """
     object_name = extract_object_name(question)
     if not object_name:
         return "Ich konnte kein bekanntes Himmelsobjekt in der Frage finden."
-    
+
     info = get_astronomy_info(object_name)
     if info:
-        summary = (
-            f"{info['name']} ist ein {info['type']}. "
-            f"Es ist {info['distance_from_earth_ly']} Lichtjahre von der Erde entfernt. "
-            f"Seine Größe beträgt {info['size_km']} km und seine Masse beträgt {info['mass_kg']} kg. "
-            f"Seine Koordinaten sind RA: {info['coordinates']['ra']}, DEC: {info['coordinates']['dec']}."
-        )
-        
+        # Metadaten-Intent erkannt? Dann Antwort ohne Modellaufruf.
+        direct = _answer_from_graph(question, info)
+        if direct:
+            return direct
+
         # Verwende den QA-Pipeline: Frage + Kontext
-        result = qa_pipeline(question=question, context=summary)
+        with _autocast():
+            result = qa_pipeline(question=question, context=info["_summary"])
         return result["answer"]
     else:
         return "Ich habe keine Informationen zu diesem Himmelsobjekt."
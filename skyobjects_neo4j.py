@@ -1,13 +1,33 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from py2neo import Graph
+from neo4j import GraphDatabase
 from transformers import pipeline
 from functools import lru_cache
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import torch
+import atexit
 import logging
 import sys
 import time
 
+from skyastro_common import DEVICE, DEVICE_INDEX, DTYPE, CPU_BF16, NUM_THREADS, autocast as _autocast
+
+# Hyperscan ist optional: falls vorhanden, wird die Namenssuche über eine
+# kompilierte DFA-Datenbank in O(|Frage|) ausgeführt, sonst per Python-Schleife.
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+# pyahocorasick ist ebenfalls optional: ein Trie mit Failure-Links findet
+# alle Namen in einem einzigen Durchlauf durch die Frage.
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
 # Logging-Konfiguration
 logging.basicConfig(
     level=logging.INFO,
@@ -17,38 +37,124 @@ logging.basicConfig(
         logging.StreamHandler(sys.stdout)
     ]
 )
+logging.info(f"PyTorch-Threads: {NUM_THREADS} (ASTRO_THREADS zum Überschreiben setzen)")
 
-# Verbindung zur Neo4j-Graphdatenbank herstellen
+# Verbindung zur Neo4j-Graphdatenbank herstellen (offizieller Bolt-Treiber
+# mit Connection-Pool; Sessions werden pro Abfrage geöffnet)
 try:
-    graph = Graph("bolt://localhost:7687", auth=("username", "password"))
+    _driver = GraphDatabase.driver(
+        "bolt://localhost:7687",
+        auth=("username", "password"),
+        max_connection_pool_size=16
+    )
+    _driver.verify_connectivity()
+    atexit.register(_driver.close)
     logging.info("Erfolgreich mit Neo4j-Datenbank verbunden")
 except Exception as e:
     logging.error(f"Fehler beim Verbinden mit der Datenbank: {str(e)}")
     sys.exit(1)
 
 # Deutsches Frage-Antwort-Modell laden (besser geeignet für QA in Deutsch)
+# Auf der GPU halbiert FP16 die Speicherbandbreite des Encoders;
+# auf der CPU bleiben die Gewichte FP32 und Autocast rechnet in BF16.
 try:
     model_name = "deepset/gelectra-base-germanquad"
     qa_pipeline = pipeline(
         "question-answering",
         model=model_name,
         tokenizer=model_name,
-        device=0  # falls GPU verfügbar ist, andernfalls: device=-1
+        use_fast=True,  # Rust-Tokenizer erzwingen statt des Python-Fallbacks
+        device=DEVICE_INDEX,
+        torch_dtype=DTYPE,
+        batch_size=8  # Fragen können als Liste in einem Batch verarbeitet werden
     )
+
+    # Auf der CPU werden die Linear-Schichten dynamisch nach INT8 quantisiert;
+    # falls die Intel Extension for PyTorch installiert ist, wird stattdessen
+    # deren optimierter Graph verwendet.
+    if DEVICE == "cpu":
+        try:
+            import intel_extension_for_pytorch as ipex
+            qa_pipeline.model = ipex.optimize(
+                qa_pipeline.model,
+                dtype=torch.bfloat16 if CPU_BF16 else torch.float32
+            )
+            logging.info("Modell mit Intel Extension for PyTorch optimiert")
+        except ImportError:
+            qa_pipeline.model = torch.quantization.quantize_dynamic(
+                qa_pipeline.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+            logging.info("Modell dynamisch nach INT8 quantisiert")
+
+    # torch.compile fusioniert Pointwise-Ops und reduziert den Python-Overhead
+    # pro Forward-Pass (ab PyTorch 2.1). Nur auf der GPU sinnvoll, da das
+    # CPU-Modell bereits quantisiert bzw. von IPEX optimiert ist.
+    if DEVICE == "cuda":
+        try:
+            _torch_version = tuple(int(p.split("+")[0]) for p in torch.__version__.split(".")[:2])
+            if _torch_version >= (2, 1):
+                qa_pipeline.model = torch.compile(qa_pipeline.model, mode="reduce-overhead", fullgraph=False)
+                logging.info("Modell mit torch.compile optimiert")
+        except Exception as e:
+            logging.warning(f"torch.compile nicht verfügbar: {str(e)}")
+
+    # Warmlauf: der erste Aufruf zahlt CUDA-Kontextaufbau, cuDNN-Autotuning
+    # und Tokenizer-Initialisierung. Ein Dummy-Aufruf mit langem Kontext
+    # verlagert diese Kosten vom ersten Nutzeraufruf an den Programmstart.
+    # Er stößt auch die torch.compile-Kompilierung an.
+    if DEVICE == "cuda":
+        torch.backends.cudnn.benchmark = True
+    with _autocast():
+        qa_pipeline(question="Wie lautet das Warmlauf-Objekt?", context="Warmlauf-Kontext. " * 32)
+
     logging.info("Frage-Antwort-Modell erfolgreich geladen")
 except Exception as e:
     logging.error(f"Fehler beim Laden des Frage-Antwort-Modells: {str(e)}")
     sys.exit(1)
 
+# Cypher-Anfragen als Modulkonstanten: derselbe Query-String trifft den
+# serverseitigen Plan-Cache, und execute_read wiederholt die Lesetransaktion
+# bei transienten Verbindungsfehlern automatisch.
+_Q_ALL_OBJECTS = """
+MATCH (obj)
+RETURN obj.name AS name, obj.type AS type, obj.distance_from_earth_ly AS distance
+"""
+_Q_SINGLE_OBJECT = """
+MATCH (obj {name: $name})
+RETURN obj.name AS name, obj.type AS type, obj.distance_from_earth_ly AS distance
+"""
+
+@lru_cache(maxsize=1)
+def _all_objects():
+    """
+    Lädt die Eigenschaften aller Himmelsobjekte in einem einzigen Round-Trip
+    in ein Dictionary. Nachfolgende Anfragen werden aus dem Speicher bedient;
+    der Befehl 'update' (reset_cache) lädt das Abbild neu.
+    """
+    try:
+        with _driver.session() as session:
+            records = session.execute_read(
+                lambda tx: [record.data() for record in tx.run(_Q_ALL_OBJECTS)]
+            )
+            return {record["name"]: record for record in records}
+    except Exception as e:
+        logging.error(f"Fehler beim Laden des Objekt-Abbilds: {str(e)}")
+        raise
+
 def query_graph_db(object_name):
-    """Abfrage der Neo4j-Graphdatenbank mit einer sicheren parametrisierten Anfrage."""
+    """
+    Liefert die Objektdaten aus dem vorab geladenen Graph-Abbild;
+    bei einem Cache-Miss wird das einzelne Objekt direkt abgefragt.
+    """
     try:
-        query = """
-        MATCH (obj {name: $object_name})
-        RETURN obj.name AS name, obj.type AS type, obj.distance_from_earth_ly AS distance
-        """
-        result = graph.run(query, object_name=object_name).data()
-        return result[0] if result else None
+        obj = _all_objects().get(object_name)
+        if obj is not None:
+            return obj
+        with _driver.session() as session:
+            record = session.execute_read(
+                lambda tx: tx.run(_Q_SINGLE_OBJECT, name=object_name).single()
+            )
+            return record.data() if record else None
     except Exception as e:
         logging.error(f"Datenbankabfrage-Fehler: {str(e)}")
         raise
@@ -57,55 +163,102 @@ def query_graph_db(object_name):
 def get_available_objects():
     """Lädt alle verfügbaren Himmelsobjekte aus der Datenbank mit Caching."""
     try:
-        query = """
-        MATCH (obj)
-        RETURN obj.name AS name
-        ORDER BY obj.name
-        """
-        results = graph.run(query).data()
-        return [result['name'] for result in results]
+        return sorted(_all_objects())
     except Exception as e:
         logging.error(f"Fehler beim Laden der verfügbaren Objekte: {str(e)}")
         raise
 
+@lru_cache(maxsize=1)
+def _get_name_database():
+    """Kompiliert eine Hyperscan-Datenbank über alle verfügbaren Objektnamen (Caching)."""
+    names = get_available_objects()
+    db = hyperscan.Database()
+    # literal=True: die Namen kommen aus der Datenbank und dürfen
+    # Regex-Metazeichen enthalten — sie müssen wörtlich gematcht werden
+    db.compile(
+        expressions=[name.encode() for name in names],
+        ids=list(range(len(names))),
+        flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SOM_LEFTMOST] * len(names),
+        literal=True
+    )
+    return db, names
+
+@lru_cache(maxsize=1)
+def _get_names_lower():
+    """Liefert die verfügbaren Objektnamen als (kleingeschrieben, original)-Paare (Caching)."""
+    return [(name.lower(), name) for name in get_available_objects()]
+
+@lru_cache(maxsize=1)
+def _get_name_automaton():
+    """Baut einen Aho-Corasick-Automaten über alle verfügbaren Objektnamen (Caching)."""
+    automaton = ahocorasick.Automaton()
+    for i, name in enumerate(get_available_objects()):
+        automaton.add_word(name.lower(), (i, name))
+    automaton.make_automaton()
+    return automaton
+
+@lru_cache(maxsize=1024)
 def extract_object_name(question):
-    """Extrahiert Objektnamen auf robuste Weise durch Abgleich mit der Datenbank."""
+    """
+    Extrahiert Objektnamen auf robuste Weise durch Abgleich mit der Datenbank.
+    Wiederholte Fragen werden memoisiert und überspringen damit auch das
+    erneute Kleinschreiben der Frage.
+    """
     try:
+        if hyperscan is not None:
+            db, names = _get_name_database()
+            hits = []
+            db.scan(
+                question.encode(),
+                match_event_handler=lambda pat_id, start, end, flags, ctx: hits.append((start, pat_id))
+            )
+            return names[min(hits)[1]] if hits else None
+
+        if ahocorasick is not None:
+            for _, (_, name) in _get_name_automaton().iter(question.lower()):
+                return name
+            return None
+
+        # Prüfen, ob eines der Objekte in der Frage vorkommt; die Namen
+        # liegen bereits kleingeschrieben vor, die Frage wird genau einmal gesenkt
         question_lower = question.lower()
-        available_objects = get_available_objects()
-        
-        # Prüfen, ob eines der Objekte in der Frage vorkommt
-        for obj in available_objects:
-            if obj.lower() in question_lower:
-                return obj
-                
+        for name_lower, name in _get_names_lower():
+            if name_lower in question_lower:
+                return name
+
         return None
     except Exception as e:
         logging.error(f"Fehler bei der Objektnamenerkennung: {str(e)}")
         raise
 
+@lru_cache(maxsize=None)
+def build_context(object_name):
+    """Erstellt einen verbesserten Kontext mit klaren Anweisungen für ein Himmelsobjekt (Caching)."""
+    info = query_graph_db(object_name)
+    if not info:
+        return None
+    return (
+        "Bitte beantworte die folgende Frage kurz und präzise basierend auf den nachfolgenden Fakten:\n\n"
+        f"{info['name']} ist ein {info['type']}. "
+        f"Es ist {info['distance']} Lichtjahre von der Erde entfernt."
+    )
+
 def ask_question(question):
     """Verarbeitet eine Frage und generiert eine Antwort mithilfe des Frage-Antwort-Modells."""
     try:
         # Extrahiere den Objektnamen aus der Frage
         object_name = extract_object_name(question)
-        
+
         if not object_name:
             return "Ich konnte kein bekanntes Himmelsobjekt in der Frage finden."
-        
-        # Hole Informationen aus der Datenbank
-        info = query_graph_db(object_name)
-        
-        if info:
-            # Erstelle einen verbesserten Kontext mit klaren Anweisungen
-            context = (
-                "Bitte beantworte die folgende Frage kurz und präzise basierend auf den nachfolgenden Fakten:\n\n"
-                f"{info['name']} ist ein {info['type']}. "
-                f"Es ist {info['distance']} Lichtjahre von der Erde entfernt."
-            )
-            
+
+        # Baue den Kontext aus den Datenbankinformationen
+        context = build_context(object_name)
+
+        if context:
             # Verwende den QA-Pipeline: Übergabe von Frage und verbessertem Kontext
-            result = qa_pipeline(question=question, context=context)
+            with _autocast():
+                result = qa_pipeline(question=question, context=context)
             return result["answer"]
         else:
             return "Ich habe keine Informationen zu diesem Himmelsobjekt."
@@ -116,12 +269,26 @@ def ask_question(question):
 def reset_cache():
     """Setzt den Cache für die verfügbaren Objekte zurück."""
     try:
+        _all_objects.cache_clear()
         get_available_objects.cache_clear()
+        _get_names_lower.cache_clear()
+        _get_name_database.cache_clear()
+        _get_name_automaton.cache_clear()
+        extract_object_name.cache_clear()
+        build_context.cache_clear()
         logging.info("Cache wurde zurückgesetzt")
     except Exception as e:
         logging.error(f"Fehler beim Zurücksetzen des Caches: {str(e)}")
         raise
 
+# Rollierendes Latenzfenster der letzten 100 Fragen (in Millisekunden)
+_latencies = deque(maxlen=100)
+
+def _latency_percentile(p):
+    """Liefert das p-Perzentil der zuletzt gemessenen Latenzen in Millisekunden."""
+    ordered = sorted(_latencies)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
 def display_help():
     """Zeigt Hilfe-Informationen an."""
     help_text = """
@@ -147,7 +314,8 @@ def main():
         # Dynamische Liste der verfügbaren Objekte laden
         available_objects = get_available_objects()
         print("\nVerfügbare Objekte:", ", ".join(available_objects))
-        
+
+        question_count = 0
         while True:
             try:
                 user_input = input("\nIhre Frage: ").strip()
@@ -169,13 +337,22 @@ def main():
                     print('\n' * 50)
                     continue
                 
-                # Frage verarbeiten
-                start_time = time.time()
+                # Frage verarbeiten; perf_counter_ns ist monoton und hat auf
+                # allen Plattformen deutlich feinere Auflösung als time.time
+                start_ns = time.perf_counter_ns()
                 answer = ask_question(user_input)
-                processing_time = time.time() - start_time
-                
+                elapsed_ms = (time.perf_counter_ns() - start_ns) / 1e6
+                _latencies.append(elapsed_ms)
+                question_count += 1
+
                 print("\nAntwort:", answer)
-                logging.debug(f"Verarbeitungszeit: {processing_time:.2f} Sekunden")
+                if logging.getLogger().isEnabledFor(logging.DEBUG):
+                    logging.debug(f"Verarbeitungszeit: {elapsed_ms:.1f} ms")
+                if question_count % 10 == 0:
+                    print(
+                        f"(Latenz über die letzten {len(_latencies)} Fragen: "
+                        f"p50 {_latency_percentile(50):.1f} ms, p95 {_latency_percentile(95):.1f} ms)"
+                    )
                 
             except Exception as e:
                 print(f"\nFehler bei der Verarbeitung: {str(e)}")
@@ -198,13 +375,38 @@ def run_example():
     ]
     
     print("\n=== Beispielanwendung ===")
-    for question in example_questions:
-        print(f"\nFrage: {question}")
-        try:
-            answer = ask_question(question)
-            print("Antwort:", answer)
-        except Exception as e:
-            print(f"Fehler bei der Beispielfrage: {str(e)}")
+    try:
+        # Kontextaufbau (Namenssuche + Datenbankzugriff) läuft nebenläufig,
+        # damit sich I/O-Wartezeiten überlappen; die Inferenz selbst bleibt
+        # ein einziger gepaddeter Batch durch die Pipeline.
+        def _prepare(question):
+            object_name = extract_object_name(question)
+            if not object_name:
+                return question, None, "Ich konnte kein bekanntes Himmelsobjekt in der Frage finden."
+            context = build_context(object_name)
+            if not context:
+                return question, None, "Ich habe keine Informationen zu diesem Himmelsobjekt."
+            return question, context, None
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            prepared = list(executor.map(_prepare, example_questions))
+
+        inputs = [{"question": q, "context": ctx} for q, ctx, _ in prepared if ctx]
+        answers = {q: error for q, _, error in prepared if error}
+
+        if inputs:
+            with _autocast():
+                results = qa_pipeline(inputs, batch_size=8)
+            if isinstance(results, dict):
+                results = [results]
+            for entry, result in zip(inputs, results):
+                answers[entry["question"]] = result["answer"]
+
+        for question in example_questions:
+            print(f"\nFrage: {question}")
+            print("Antwort:", answers[question])
+    except Exception as e:
+        print(f"Fehler bei der Beispielanwendung: {str(e)}")
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Regressionstest für die Hyperscan-Namenssuche: die Datenbank muss im
+Literal-Modus kompiliert werden (literal=True), damit Objektnamen mit
+Regex-Metazeichen — etwa "M31 (Andromeda)" aus einem Neo4j-Katalog —
+wörtlich gematcht werden statt als Muster zu scheitern.
+
+Die Einstiegsskripte laden beim Import Modell und Datenbankverbindung,
+daher wird der Kompilier- und Scan-Pfad aus _get_name_database bzw.
+_NAME_DB/_scan_object_name hier direkt nachgestellt.
+"""
+
+import pytest
+
+hyperscan = pytest.importorskip("hyperscan")
+
+
+def _build_database(names):
+    # Entspricht dem Aufbau in skyobjects.py und skyobjects_neo4j.py
+    db = hyperscan.Database()
+    db.compile(
+        expressions=[name.encode() for name in names],
+        ids=list(range(len(names))),
+        flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SOM_LEFTMOST] * len(names),
+        literal=True
+    )
+    return db
+
+
+def _scan(db, names, question):
+    # Entspricht _scan_object_name: am weitesten links stehender Treffer
+    hits = []
+    db.scan(
+        question.encode(),
+        match_event_handler=lambda pat_id, start, end, flags, ctx: hits.append((start, pat_id))
+    )
+    return names[min(hits)[1]] if hits else None
+
+
+def test_names_with_metacharacters_compile_and_match():
+    names = ["M31 (Andromeda)", "NGC 224+", "Sirius"]
+    db = _build_database(names)
+    assert _scan(db, names, "Wie weit ist M31 (Andromeda) entfernt?") == "M31 (Andromeda)"
+    assert _scan(db, names, "Was ist NGC 224+?") == "NGC 224+"
+
+
+def test_matching_is_caseless():
+    names = ["Orion-Nebel", "Jupiter"]
+    db = _build_database(names)
+    assert _scan(db, names, "beschreibe den orion-nebel") == "Orion-Nebel"
+
+
+def test_no_match_returns_none():
+    names = ["Sonne", "Sirius"]
+    db = _build_database(names)
+    assert _scan(db, names, "Wie spät ist es?") is None
+
+
+def test_leftmost_hit_wins():
+    names = ["Jupiter", "Sonne"]
+    db = _build_database(names)
+    assert _scan(db, names, "Umkreist Jupiter die Sonne?") == "Jupiter"